@@ -9,6 +9,7 @@ Uso CLI (con Typer):
   py ProyectoV3.py add
   py ProyectoV3.py list
   py ProyectoV3.py export -o clientes.xlsx
+  py ProyectoV3.py import clientes.csv
   py ProyectoV3.py shell        
 
 Modo Web (local con Flask):
@@ -21,14 +22,21 @@ Modo Web (local con Flask):
 
 from __future__ import annotations
 
+import csv
+import hashlib
 import io
 import os
+import queue
 import shlex
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import typer
 from rich.console import Console
@@ -36,16 +44,23 @@ from rich.table import Table
 
 import phonenumbers
 from phonenumbers import NumberParseException, PhoneNumberFormat
-from email_validator import validate_email, EmailNotValidError
+from email_validator import validate_email, EmailNotValidError, caching_resolver
 
 import smtplib
 
+# --- Excel (opcional): se carga una vez al arrancar, no en cada exportación ---
+try:
+    import xlsxwriter  # type: ignore
+except ImportError:  # sin xlsxwriter se usa pandas + openpyxl (ver Exportación)
+    xlsxwriter = None
+
 # --- SMTP (leer de variables de entorno) ---
 SMTP_HOST = os.getenv("SMTP_HOST", "")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))  # 587 STARTTLS / 465 SSL
 SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASS = os.getenv("SMTP_PASS", "")
 SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER or "no-reply@example.com")
+SMTP_POOL_SIZE = max(1, int(os.getenv("SMTP_POOL_SIZE", "4")))  # no abrir más de lo que tolera el proveedor
 
 # --- Flask ---
 from flask import (
@@ -56,7 +71,10 @@ from flask import (
     url_for,
     flash,
     send_file,
+    session,
+    jsonify,
 )
+from jinja2 import FileSystemBytecodeCache
 
 # --- Configuración básica ---
 APP = typer.Typer(add_completion=False, help="Gestor de clientes (SQLite + CLI + Web).")
@@ -66,6 +84,8 @@ BASE_DIR = Path(__file__).resolve().parent
 DB_PATH = BASE_DIR / "clientes.db"
 LOG_FILE = BASE_DIR / "gestor.log"
 TEMPLATES_DIR = BASE_DIR / "templates"
+STATIC_DIR = BASE_DIR / "static"
+JINJA_CACHE_DIR = BASE_DIR / ".jinja_cache"
 
 # =========================
 # Utilidades / Logging
@@ -80,6 +100,90 @@ def log(msg: str) -> None:
     except Exception:
         pass
 
+class SMTPPool:
+    """
+    Conexiones SMTP ya logueadas (EHLO + STARTTLS + LOGIN) que se reutilizan entre envíos.
+    Si cambia la configuración se descartan las conexiones abiertas con la anterior.
+    """
+
+    REINTENTABLES = {421, 450, 454}  # códigos transitorios: reconectar y reintentar
+
+    def __init__(self, size: int = SMTP_POOL_SIZE, reintentos: int = 3) -> None:
+        self.reintentos = reintentos
+        self._libres: queue.LifoQueue[Tuple[tuple, smtplib.SMTP]] = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(size)
+
+    @staticmethod
+    def _clave(cfg: dict) -> tuple:
+        return (cfg["host"], cfg["port"], cfg["user"], cfg["password"])
+
+    @staticmethod
+    def _abrir(cfg: dict) -> smtplib.SMTP:
+        server = smtplib.SMTP(cfg["host"], cfg["port"], timeout=20)
+        try:
+            server.ehlo()
+            if cfg["port"] == 587:
+                server.starttls()
+                server.ehlo()
+            server.login(cfg["user"], cfg["password"])
+        except Exception:
+            SMTPPool._cerrar(server)
+            raise
+        return server
+
+    @staticmethod
+    def _cerrar(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _tomar(self, clave: tuple) -> Optional[smtplib.SMTP]:
+        """Devuelve una conexión libre y viva para `clave`, o None si no hay."""
+        while True:
+            try:
+                c, server = self._libres.get_nowait()
+            except queue.Empty:
+                return None
+            if c == clave:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except smtplib.SMTPException:
+                    pass
+            self._cerrar(server)
+
+    @contextmanager
+    def acquire(self, cfg: dict) -> Iterator[smtplib.SMTP]:
+        clave = self._clave(cfg)
+        with self._cupos:
+            server = self._tomar(clave) or self._abrir(cfg)
+            try:
+                yield server
+            except Exception:
+                self._cerrar(server)  # estado desconocido: no devolverla al pool
+                raise
+            self._libres.put((clave, server))
+
+    def sendmail(self, cfg: dict, destino: str, msg: bytes) -> None:
+        espera = 1.0
+        for intento in range(self.reintentos + 1):
+            try:
+                with self.acquire(cfg) as server:
+                    server.sendmail(cfg["from"], [destino], msg)
+                return
+            except smtplib.SMTPServerDisconnected:
+                if intento == self.reintentos:
+                    raise
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code not in self.REINTENTABLES or intento == self.reintentos:
+                    raise
+            time.sleep(espera)  # backoff exponencial antes de reconectar
+            espera *= 2
+
+
+_SMTP_POOL = SMTPPool()
+
 def enviar_email(destino: str, asunto: str, cuerpo: str) -> None:
     cfg = get_smtp_config()  # lee de SQLite y, si falta, cae a env vars
     if not (cfg["host"] and cfg["user"] and cfg["password"]):
@@ -95,13 +199,34 @@ def enviar_email(destino: str, asunto: str, cuerpo: str) -> None:
         f"{cuerpo}"
     ).encode("utf-8")
 
-    with smtplib.SMTP(cfg["host"], cfg["port"], timeout=20) as server:
-        server.ehlo()
-        if cfg["port"] == 587:
-            server.starttls()
-            server.ehlo()
-        server.login(cfg["user"], cfg["password"])
-        server.sendmail(cfg["from"], [destino], msg)
+    _SMTP_POOL.sendmail(cfg, destino, msg)
+
+# Envío en segundo plano (web): la request encola y vuelve sin esperar al SMTP
+_MAIL_Q: queue.Queue[Tuple[str, str, str]] = queue.Queue()
+_mail_worker: Optional[threading.Thread] = None
+_mail_worker_lock = threading.Lock()
+
+def _mail_worker_loop() -> None:
+    while True:
+        destino, asunto, cuerpo = _MAIL_Q.get()
+        try:
+            enviar_email(destino, asunto, cuerpo)
+            log(f"MAIL {destino}")
+        except Exception as e:
+            log(f"ERROR MAIL {destino}: {e}")
+        finally:
+            _MAIL_Q.task_done()
+
+def encolar_email(destino: str, asunto: str, cuerpo: str) -> None:
+    """Deja el correo en la cola; el hilo de envío (se arranca la primera vez) lo manda."""
+    global _mail_worker
+    if not smtp_configurado():
+        raise RuntimeError("SMTP no configurado. Completá los Ajustes primero.")
+    with _mail_worker_lock:
+        if _mail_worker is None or not _mail_worker.is_alive():
+            _mail_worker = threading.Thread(target=_mail_worker_loop, name="mail-worker", daemon=True)
+            _mail_worker.start()
+    _MAIL_Q.put((destino, asunto, cuerpo))
 
 # =========================
 # Modelo de dominio
@@ -121,14 +246,173 @@ class Cliente:
 # Base de datos (SQLite)
 # =========================
 
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+# PRAGMAs por conexión: WAL es persistente en el archivo, pero synchronous,
+# cache_size, temp_store, busy_timeout y foreign_keys hay que setearlos cada vez.
+_PRAGMAS_SQL = """
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -20000;
+PRAGMA mmap_size = 268435456;
+PRAGMA busy_timeout = 5000;
+PRAGMA foreign_keys = ON;
+"""
+# journal_mode solo lo puede cambiar una conexión con permiso de escritura
+_PRAGMAS_WRITE_SQL = "PRAGMA journal_mode = WAL;" + _PRAGMAS_SQL
+# las conexiones viven en el pool: que el driver guarde compilados todos los SQL de la app
+_STMT_CACHE_SIZE = 256
+# timestamp "AAAA-MM-DDTHH:MM:SS" (hora local) generado por SQLite dentro del propio INSERT/UPDATE
+_SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')"
+_TS_FMT = "%Y-%m-%dT%H:%M:%S"  # mismo formato, para los lotes armados en Python
+
+
+def _lower_u(valor):
+    return valor.lower() if isinstance(valor, str) else valor
+
+
+def _connect(readonly: bool = False) -> sqlite3.Connection:
+    # isolation_level=None -> autocommit; las escrituras abren su transacción con writetxn()
+    if readonly:
+        conn = sqlite3.connect(
+            f"{DB_PATH.as_uri()}?mode=ro",
+            uri=True,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=_STMT_CACHE_SIZE,
+        )
+        conn.executescript(_PRAGMAS_SQL)
+    else:
+        conn = sqlite3.connect(
+            DB_PATH, isolation_level=None, check_same_thread=False, cached_statements=_STMT_CACHE_SIZE
+        )
+        conn.executescript(_PRAGMAS_WRITE_SQL)
     conn.row_factory = sqlite3.Row
+    # lower() de SQLite solo baja ASCII: para buscar "álvarez" en "Álvarez" hace falta el de Python
+    conn.create_function("lower_u", 1, _lower_u, deterministic=True)
     return conn
 
 
+class _ConnPool:
+    """Pool mínimo de conexiones (checkout/return sobre queue.Queue), se abren a demanda."""
+
+    def __init__(self, size: int, readonly: bool = False) -> None:
+        self.size = size
+        self.readonly = readonly
+        self._libres: queue.Queue[sqlite3.Connection] = queue.Queue(maxsize=size)
+        self._abiertas = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            abrir = self._abiertas < self.size
+            if abrir:
+                self._abiertas += 1
+        if not abrir:
+            return self._libres.get()  # pool lleno: esperar a que devuelvan una
+        try:
+            return _connect(readonly=self.readonly)
+        except Exception:
+            with self._lock:
+                self._abiertas -= 1
+            raise
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()  # nunca devolver una conexión con una transacción a medias
+        self._libres.put_nowait(conn)
+
+
+# Lecturas en paralelo (WAL) y un único escritor para no pelear por el lock de SQLite
+_READ_POOL = _ConnPool(os.cpu_count() or 4, readonly=True)
+_WRITE_POOL = _ConnPool(1)
+_tls = threading.local()
+
+
+@contextmanager
+def get_conn(readonly: bool = False) -> Iterator[sqlite3.Connection]:
+    """
+    Presta una conexión del pool y la devuelve al salir del `with`.
+    Si el hilo ya tiene una prestada (llamadas anidadas) se reutiliza esa.
+    """
+    actual = getattr(_tls, "conn", None)
+    if actual is not None and (readonly or not _tls.readonly):
+        yield actual
+        return
+
+    pool = _READ_POOL if readonly else _WRITE_POOL
+    conn = pool.acquire()
+    previa = (actual, getattr(_tls, "readonly", False))
+    _tls.conn, _tls.readonly = conn, readonly
+    try:
+        yield conn
+    finally:
+        _tls.conn, _tls.readonly = previa
+        pool.release(conn)
+
+
+@contextmanager
+def writetxn(con: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """
+    Transacción de escritura explícita: BEGIN IMMEDIATE toma el lock de escritura de entrada
+    (no hay upgrade a mitad de camino que termine en SQLITE_BUSY); COMMIT al salir, ROLLBACK si falla.
+    Si la conexión ya está dentro de una transacción, se suma a ella.
+    """
+    if con.in_transaction:
+        yield con
+        return
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        yield con
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("COMMIT")
+
+
+@contextmanager
+def _sesion_conn() -> Iterator[sqlite3.Connection]:
+    """
+    Fija al hilo actual una conexión propia (fuera del pool) mientras dure el bloque;
+    get_conn() la devuelve sin abrir ni pedir otra. Pensado para sesiones largas como el shell.
+    """
+    conn = _connect()
+    previa = (getattr(_tls, "conn", None), getattr(_tls, "readonly", False))
+    _tls.conn, _tls.readonly = conn, False
+    try:
+        yield conn
+    finally:
+        _tls.conn, _tls.readonly = previa
+        conn.close()
+
+
+@contextmanager
+def get_conn_tuples(readonly: bool = True) -> Iterator[sqlite3.Connection]:
+    """Como get_conn(), pero las filas salen como tuplas (sin sqlite3.Row) para recorridos masivos."""
+    with get_conn(readonly=readonly) as con:
+        previo = con.row_factory
+        con.row_factory = None
+        try:
+            yield con
+        finally:
+            con.row_factory = previo
+
+
+_DB_INITIALIZED = False  # el DDL corre una sola vez por proceso (el shell re-invoca la CLI por comando)
+SCHEMA_VERSION = 5       # se guarda en PRAGMA user_version; subirlo cuando cambie el DDL
+
 def init_db() -> None:
+    global _DB_INITIALIZED
+    if _DB_INITIALIZED:
+        return
+    existe = DB_PATH.exists()
     with get_conn() as con:
+        # base ya creada y al día: no hace falta re-parsear todo el DDL
+        if existe and con.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            _DB_INITIALIZED = True
+            return
         con.executescript("""
         PRAGMA foreign_keys = ON;
 
@@ -142,9 +426,15 @@ def init_db() -> None:
             activo INTEGER NOT NULL DEFAULT 1,
             notas TEXT DEFAULT '',
             created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL
+            updated_at TEXT NOT NULL,
+            search_key TEXT NOT NULL DEFAULT ''
         );
         CREATE UNIQUE INDEX IF NOT EXISTS ux_clientes_email ON clientes(email);
+        /* listados (repo_list): filtro por activo + orden servidos por índice, sin sort */
+        CREATE INDEX IF NOT EXISTS ix_clientes_activo_orden
+            ON clientes(activo, apellido COLLATE NOCASE, nombre COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS ix_clientes_apellido_nombre
+            ON clientes(apellido COLLATE NOCASE, nombre COLLATE NOCASE);
 
         /* ==== Notas ==== */
         CREATE TABLE IF NOT EXISTS notas (
@@ -172,30 +462,90 @@ def init_db() -> None:
             FOREIGN KEY (cliente_id) REFERENCES clientes(id) ON DELETE SET NULL
         );
         CREATE INDEX IF NOT EXISTS ix_turnos_inicio ON turnos(inicio);
+
+        /* ==== Revisiones: contador por tabla, lo suben los triggers (ETag de exportación) ==== */
+        CREATE TABLE IF NOT EXISTS revisiones (
+            tabla TEXT PRIMARY KEY,
+            n INTEGER NOT NULL
+        );
+        /* nonce al azar por base: si se borra clientes.db y se recrea, el contador vuelve a 1
+           pero los ETag viejos no coinciden */
+        INSERT OR IGNORE INTO revisiones (tabla, n) VALUES ('_base', abs(random()));
+        /* Sin trigger de INSERT: con AUTOINCREMENT cada alta sube MAX(id), que ya entra en el
+           ETag, y un UPSERT por fila le sumaba ~18% al import por lotes */
+        DROP TRIGGER IF EXISTS tr_clientes_rev_ins;
+        CREATE TRIGGER IF NOT EXISTS tr_clientes_rev_upd AFTER UPDATE ON clientes BEGIN
+            INSERT INTO revisiones (tabla, n) VALUES ('clientes', 1)
+            ON CONFLICT(tabla) DO UPDATE SET n = n + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS tr_clientes_rev_del AFTER DELETE ON clientes BEGIN
+            INSERT INTO revisiones (tabla, n) VALUES ('clientes', 1)
+            ON CONFLICT(tabla) DO UPDATE SET n = n + 1;
+        END;
         """)
+        # v2: clientes.search_key (bases creadas antes no la tienen)
+        columnas = {r["name"] for r in con.execute("PRAGMA table_info(clientes)")}
+        with writetxn(con):
+            if "search_key" not in columnas:
+                con.execute("ALTER TABLE clientes ADD COLUMN search_key TEXT NOT NULL DEFAULT ''")
+            con.execute(f"UPDATE clientes SET search_key = {_SQL_SEARCH_KEY}")
+            # v4: antes las conexiones no activaban foreign_keys y borrar un cliente dejaba
+            # sus notas huérfanas (y turnos apuntando a un id que ya no existe)
+            con.execute("DELETE FROM notas WHERE cliente_id NOT IN (SELECT id FROM clientes)")
+            con.execute(
+                "UPDATE turnos SET cliente_id = NULL"
+                " WHERE cliente_id IS NOT NULL AND cliente_id NOT IN (SELECT id FROM clientes)"
+            )
+        con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    _DB_INITIALIZED = True
 
 # =========================
 # Validaciones y normalización
 # =========================
 
+_dns_resolver = None  # resolver con cache (respeta el TTL): un lookup MX por dominio, no por email
+
+def _resolver():
+    global _dns_resolver
+    if _dns_resolver is None:
+        _dns_resolver = caching_resolver()
+    return _dns_resolver
+
 def validar_y_normalizar_email(email: str) -> str:
     try:
-        result = validate_email(email, check_deliverability=True)
+        result = validate_email(email, check_deliverability=True, dns_resolver=_resolver())
         return result.email.lower()
     except EmailNotValidError as e:
         raise ValueError(f"Email inválido: {e}")
 
-def validar_y_normalizar_telefono(telefono: str, region: str = DEFAULT_REGION) -> str:
+@lru_cache(maxsize=4096)
+def validar_email_sintaxis(email: str) -> str:
+    """Solo sintaxis, sin consultar DNS/MX: alcanza para buscar emails ya guardados."""
+    try:
+        result = validate_email(email, check_deliverability=False)
+        return result.email.lower()
+    except EmailNotValidError as e:
+        raise ValueError(f"Email inválido: {e}")
+
+@lru_cache(maxsize=8192)
+def _telefono_cached(telefono: str, region: str) -> Tuple[bool, str]:
+    # lru_cache no guarda excepciones: los errores se cachean como (False, mensaje)
     try:
         num = phonenumbers.parse(telefono, region)
         if not (
             phonenumbers.is_valid_number(num)
             and phonenumbers.is_valid_number_for_region(num, region)
         ):
-            raise ValueError(f"Teléfono inválido para la región {region}.")
-        return phonenumbers.format_number(num, PhoneNumberFormat.E164)  # +14155552671
+            return False, f"Teléfono inválido para la región {region}."
+        return True, phonenumbers.format_number(num, PhoneNumberFormat.E164)  # +14155552671
     except NumberParseException as e:
-        raise ValueError(f"Teléfono inválido: {e}")
+        return False, f"Teléfono inválido: {e}"
+
+def validar_y_normalizar_telefono(telefono: str, region: str = DEFAULT_REGION) -> str:
+    ok, valor = _telefono_cached(telefono, region)
+    if not ok:
+        raise ValueError(valor)
+    return valor
 
 # =========================
 # Turnos
@@ -213,40 +563,47 @@ def _combine_fecha_hora(fecha: str, hora: str) -> str:
 
 def repo_turnos_add(cliente_id: Optional[int], fecha: str, hora: str, motivo: str) -> int:
     inicio = _combine_fecha_hora(fecha, hora)
-    now = _dt.now().isoformat(timespec="seconds")
-    with get_conn() as con:
+    with get_conn() as con, writetxn(con):
         cur = con.execute(
-            "INSERT INTO turnos (cliente_id, inicio, motivo, created_at) VALUES (?, ?, ?, ?)",
-            (cliente_id, inicio, motivo.strip(), now),
+            f"INSERT INTO turnos (cliente_id, inicio, motivo, created_at) VALUES (?, ?, ?, {_SQL_NOW})",
+            (cliente_id, inicio, motivo.strip()),
         )
         return int(cur.lastrowid)
 
+_SQL_TURNOS_SELECT = """
+    SELECT t.id, t.inicio, t.motivo, t.cliente_id,
+           c.nombre, c.apellido, c.email
+    FROM turnos t
+    LEFT JOIN clientes c ON c.id = t.cliente_id
+"""
+_SQL_TURNOS_ALL = _SQL_TURNOS_SELECT + "ORDER BY t.inicio ASC"
+_SQL_TURNOS_FUTUROS = _SQL_TURNOS_SELECT + "WHERE t.inicio >= ? ORDER BY t.inicio ASC"
+_SQL_TURNOS_PASADOS = _SQL_TURNOS_SELECT + "WHERE t.inicio < ? ORDER BY t.inicio DESC"
+_SQL_TURNOS_PASADOS_LIM = _SQL_TURNOS_PASADOS + " LIMIT ?"
+
 def repo_turnos_list(futuro: Optional[bool] = None) -> List[sqlite3.Row]:
-    now = _dt.now().strftime("%Y-%m-%d %H:%M")
-    where, params, order = "", [], "t.inicio ASC"
-    if futuro is True:
-        where, params = "WHERE t.inicio >= ?", [now]
-        order = "t.inicio ASC"
-    elif futuro is False:
-        where, params = "WHERE t.inicio < ?", [now]
-        order = "t.inicio DESC"
+    if futuro is None:
+        sql, params = _SQL_TURNOS_ALL, ()
+    else:
+        now = _dt.now().strftime("%Y-%m-%d %H:%M")
+        sql = _SQL_TURNOS_FUTUROS if futuro else _SQL_TURNOS_PASADOS
+        params = (now,)
 
-    with get_conn() as con:
-        cur = con.execute(
-            f"""
-            SELECT t.id, t.inicio, t.motivo, t.cliente_id,
-                   c.nombre, c.apellido, c.email
-            FROM turnos t
-            LEFT JOIN clientes c ON c.id = t.cliente_id
-            {where}
-            ORDER BY {order}
-            """,
-            params,
-        )
+    with get_conn(readonly=True) as con:
+        cur = con.execute(sql, params)
         return list(cur.fetchall())
 
+def repo_turnos_upcoming() -> List[sqlite3.Row]:
+    return repo_turnos_list(True)
+
+def repo_turnos_recent_past(limit: int = 20) -> List[sqlite3.Row]:
+    """Últimos `limit` turnos ya pasados; el LIMIT lo resuelve SQLite (usa ix_turnos_inicio)."""
+    now = _dt.now().strftime("%Y-%m-%d %H:%M")
+    with get_conn(readonly=True) as con:
+        return con.execute(_SQL_TURNOS_PASADOS_LIM, (now, limit)).fetchall()
+
 def repo_turnos_get(turno_id: int) -> Optional[sqlite3.Row]:
-    with get_conn() as con:
+    with get_conn(readonly=True) as con:
         cur = con.execute(
             """
             SELECT t.id, t.inicio, t.motivo, t.cliente_id,
@@ -261,7 +618,7 @@ def repo_turnos_get(turno_id: int) -> Optional[sqlite3.Row]:
 
 def repo_turnos_update(turno_id: int, *, cliente_id: Optional[int], fecha: str, hora: str, motivo: str) -> bool:
     inicio = _combine_fecha_hora(fecha, hora)
-    with get_conn() as con:
+    with get_conn() as con, writetxn(con):
         cur = con.execute(
             "UPDATE turnos SET cliente_id = ?, inicio = ?, motivo = ? WHERE id = ?",
             (cliente_id, inicio, motivo.strip(), turno_id),
@@ -269,7 +626,7 @@ def repo_turnos_update(turno_id: int, *, cliente_id: Optional[int], fecha: str,
         return cur.rowcount > 0
 
 def repo_turnos_delete(turno_id: int) -> bool:
-    with get_conn() as con:
+    with get_conn() as con, writetxn(con):
         cur = con.execute("DELETE FROM turnos WHERE id = ?", (turno_id,))
         return cur.rowcount > 0
 
@@ -277,37 +634,99 @@ def repo_turnos_delete(turno_id: int) -> bool:
 # Repositorio (CRUD)
 # =========================
 
+# Texto de búsqueda ya en minúsculas, guardado en clientes.search_key al escribir la fila
+# (así repo_search no tiene que bajar cuatro columnas por fila en cada consulta).
+_SQL_SEARCH_KEY = "lower_u(nombre || ' ' || apellido || ' ' || email || ' ' || telefono_e164)"
+
+def _search_key(nombre: str, apellido: str, email: str, telefono_e164: str) -> str:
+    return f"{nombre} {apellido} {email} {telefono_e164}".lower()  # igual que _SQL_SEARCH_KEY
+
 def repo_add(c: Cliente) -> int:
-    now = datetime.now().isoformat(timespec="seconds")
-    with get_conn() as con:
+    with get_conn() as con, writetxn(con):
         cur = con.execute(
-            """
-            INSERT INTO clientes (nombre, apellido, telefono_e164, email, activo, notas, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            f"""
+            INSERT INTO clientes (nombre, apellido, telefono_e164, email, activo, notas, created_at, updated_at, search_key)
+            VALUES (?, ?, ?, ?, ?, ?, {_SQL_NOW}, {_SQL_NOW}, ?)
             """,
-            (c.nombre, c.apellido, c.telefono_e164, c.email, c.activo, c.notas, now, now),
+            (c.nombre, c.apellido, c.telefono_e164, c.email, c.activo, c.notas,
+             _search_key(c.nombre, c.apellido, c.email, c.telefono_e164)),
         )
         return int(cur.lastrowid)
 
+def repo_add_many(clientes: Iterable[Cliente]) -> List[int]:
+    """Inserta varios clientes en una sola transacción (un único COMMIT/fsync) y devuelve sus ids."""
+    now = time.strftime(_TS_FMT)
+    rows = [
+        (c.nombre, c.apellido, c.telefono_e164, c.email, c.activo, c.notas, now, now,
+         _search_key(c.nombre, c.apellido, c.email, c.telefono_e164))
+        for c in clientes
+    ]
+    if not rows:
+        return []
+    with get_conn() as con, writetxn(con):
+        con.executemany(
+            """
+            INSERT INTO clientes (nombre, apellido, telefono_e164, email, activo, notas, created_at, updated_at, search_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        # executemany() descarta las filas de un RETURNING; con el lock de escritura tomado
+        # (BEGIN IMMEDIATE) y AUTOINCREMENT los ids del lote son consecutivos hasta el último.
+        ultimo = con.execute("SELECT last_insert_rowid()").fetchone()[0]
+    return list(range(ultimo - len(rows) + 1, ultimo + 1))
+
+_SQL_LIST_SELECT = """
+    SELECT id, nombre, apellido, telefono_e164 AS telefono, email, activo, notas, created_at, updated_at
+    FROM clientes
+"""
+_SQL_LIST_ORDER = "ORDER BY apellido COLLATE NOCASE, nombre COLLATE NOCASE"
+_SQL_LIST_ALL = _SQL_LIST_SELECT + _SQL_LIST_ORDER
+_SQL_LIST_ACTIVE = _SQL_LIST_SELECT + "WHERE activo = 1 " + _SQL_LIST_ORDER
+_SQL_LIST_INACTIVE = _SQL_LIST_SELECT + "WHERE activo = 0 " + _SQL_LIST_ORDER
+
 def repo_list(activo: Optional[bool] = None) -> List[sqlite3.Row]:
-    where = ""
     if activo is True:
-        where = "WHERE activo = 1"
+        sql = _SQL_LIST_ACTIVE
     elif activo is False:
-        where = "WHERE activo = 0"
-    with get_conn() as con:
-        cur = con.execute(
-            f"""
-            SELECT id, nombre, apellido, telefono_e164 AS telefono, email, activo, notas, created_at, updated_at
-            FROM clientes
-            {where}
-            ORDER BY apellido COLLATE NOCASE, nombre COLLATE NOCASE
-            """
-        )
+        sql = _SQL_LIST_INACTIVE
+    else:
+        sql = _SQL_LIST_ALL
+    with get_conn(readonly=True) as con:
+        cur = con.execute(sql)
+        return list(cur.fetchall())
+
+# Selectores (<select> de notas, correo y turnos): solo lo que muestra el template.
+# Sin filtrar por activo, igual que antes: un turno o nota puede apuntar a un cliente inactivo.
+_SQL_LIST_SELECT_OPCIONES = "SELECT id, nombre, apellido, email FROM clientes " + _SQL_LIST_ORDER
+
+def repo_list_for_select() -> List[sqlite3.Row]:
+    with get_conn(readonly=True) as con:
+        return con.execute(_SQL_LIST_SELECT_OPCIONES).fetchall()
+
+_SQL_SEARCH_MATCH = "instr(search_key, :q) "
+_SQL_SEARCH_ALL = _SQL_LIST_SELECT + "WHERE " + _SQL_SEARCH_MATCH + _SQL_LIST_ORDER
+_SQL_SEARCH_ACTIVE = _SQL_LIST_SELECT + "WHERE activo = 1 AND " + _SQL_SEARCH_MATCH + _SQL_LIST_ORDER
+
+def repo_counts() -> Dict[str, int]:
+    """Total, activos e inactivos en una sola pasada sobre la tabla."""
+    with get_conn(readonly=True) as con:
+        total, activos, inactivos = con.execute(
+            "SELECT COUNT(*), COALESCE(SUM(activo = 1), 0), COALESCE(SUM(activo = 0), 0) FROM clientes"
+        ).fetchone()
+    return {"total": total, "activos": activos, "inactivos": inactivos}
+
+def repo_search(q: str, solo_activos: bool = False) -> List[sqlite3.Row]:
+    """Como repo_list, pero filtrando en SQLite por texto en nombre, apellido, email o teléfono."""
+    q = q.strip().lower()
+    if not q:
+        return repo_list(True if solo_activos else None)
+    with get_conn(readonly=True) as con:
+        cur = con.execute(_SQL_SEARCH_ACTIVE if solo_activos else _SQL_SEARCH_ALL, {"q": q})
         return list(cur.fetchall())
 
 def repo_get_by_email(email: str) -> Optional[sqlite3.Row]:
-    with get_conn() as con:
+    with get_conn(readonly=True) as con:
         cur = con.execute(
             """
             SELECT id, nombre, apellido, telefono_e164, email, activo, notas, created_at, updated_at
@@ -318,39 +737,97 @@ def repo_get_by_email(email: str) -> Optional[sqlite3.Row]:
         )
         return cur.fetchone()
 
+def repo_emails_existentes(emails: Iterable[str]) -> set:
+    """Cuáles de estos emails ya están en clientes (una consulta cada 500)."""
+    lista = list(dict.fromkeys(emails))
+    existentes: set = set()
+    with get_conn(readonly=True) as con:
+        for k in range(0, len(lista), 500):
+            parte = lista[k:k + 500]
+            cur = con.execute(
+                f"SELECT email FROM clientes WHERE email IN ({','.join('?' * len(parte))})",
+                parte,
+            )
+            existentes.update(r[0] for r in cur)
+    return existentes
+
+_SQL_NOTAS_SELECT = """
+    SELECT n.id, n.cliente_id, n.contenido, n.created_at,
+           c.nombre, c.apellido, c.email
+    FROM notas n
+    JOIN clientes c ON c.id = n.cliente_id
+"""
+_SQL_NOTAS_ALL = _SQL_NOTAS_SELECT + "ORDER BY n.created_at DESC"
+_SQL_NOTAS_CLIENTE = _SQL_NOTAS_SELECT + "WHERE n.cliente_id = ? ORDER BY n.created_at DESC"
+
 def repo_notas_list(cliente_id: Optional[int] = None) -> List[sqlite3.Row]:
-    where = "WHERE n.cliente_id = ?" if cliente_id else ""
-    params = (cliente_id,) if cliente_id else ()
-    with get_conn() as con:
-        cur = con.execute(
-            f"""
-            SELECT n.id, n.cliente_id, n.contenido, n.created_at,
-                   c.nombre, c.apellido, c.email
-            FROM notas n
-            JOIN clientes c ON c.id = n.cliente_id
-            {where}
-            ORDER BY n.created_at DESC
-            """,
-            params,
-        )
+    if cliente_id:
+        sql, params = _SQL_NOTAS_CLIENTE, (cliente_id,)
+    else:
+        sql, params = _SQL_NOTAS_ALL, ()
+    with get_conn(readonly=True) as con:
+        cur = con.execute(sql, params)
         return list(cur.fetchall())
 
+def repo_notas_recent(limit: int = 5) -> List[sqlite3.Row]:
+    with get_conn(readonly=True) as con:
+        cur = con.execute(_SQL_NOTAS_ALL + " LIMIT ?", (limit,))
+        return list(cur.fetchall())
+
+def repo_notas_count() -> int:
+    # mismo JOIN que el listado de notas: el KPI cuenta lo que muestra /notas
+    with get_conn(readonly=True) as con:
+        return con.execute(
+            "SELECT COUNT(*) FROM notas n JOIN clientes c ON c.id = n.cliente_id"
+        ).fetchone()[0]
+
+def repo_notas_list_for_clients(cliente_ids: Iterable[int]) -> Dict[int, List[sqlite3.Row]]:
+    """Notas de varios clientes en una sola consulta (evita un repo_notas_list por cliente)."""
+    ids = list(dict.fromkeys(cliente_ids))
+    por_cliente: Dict[int, List[sqlite3.Row]] = {i: [] for i in ids}
+    if not ids:
+        return por_cliente
+    with get_conn(readonly=True) as con:
+        # de a 500 para no pasar el límite de parámetros de SQLite
+        for k in range(0, len(ids), 500):
+            parte = ids[k:k + 500]
+            cur = con.execute(
+                _SQL_NOTAS_SELECT
+                + f"WHERE n.cliente_id IN ({','.join('?' * len(parte))}) ORDER BY n.created_at DESC",
+                parte,
+            )
+            for r in cur:
+                por_cliente[r["cliente_id"]].append(r)
+    return por_cliente
+
 def repo_notas_add(cliente_id: int, contenido: str) -> int:
-    now = datetime.now().isoformat(timespec="seconds")
-    with get_conn() as con:
+    with get_conn() as con, writetxn(con):
         cur = con.execute(
-            "INSERT INTO notas (cliente_id, contenido, created_at) VALUES (?, ?, ?)",
-            (cliente_id, contenido.strip(), now),
+            f"INSERT INTO notas (cliente_id, contenido, created_at) VALUES (?, ?, {_SQL_NOW})",
+            (cliente_id, contenido.strip()),
         )
         return int(cur.lastrowid)
 
+def repo_notas_add_many(items: Iterable[Tuple[int, str]]) -> int:
+    """Inserta varias notas (cliente_id, contenido) en una sola transacción."""
+    now = time.strftime(_TS_FMT)
+    rows = [(cliente_id, contenido.strip(), now) for cliente_id, contenido in items]
+    if not rows:
+        return 0
+    with get_conn() as con, writetxn(con):
+        con.executemany(
+            "INSERT INTO notas (cliente_id, contenido, created_at) VALUES (?, ?, ?)",
+            rows,
+        )
+    return len(rows)
+
 def repo_notas_delete(nota_id: int) -> bool:
-    with get_conn() as con:
+    with get_conn() as con, writetxn(con):
         cur = con.execute("DELETE FROM notas WHERE id = ?", (nota_id,))
         return cur.rowcount > 0
 
 def repo_get_by_id(cliente_id: int) -> Optional[sqlite3.Row]:
-    with get_conn() as con:
+    with get_conn(readonly=True) as con:
         cur = con.execute(
             """
             SELECT id, nombre, apellido, telefono_e164 AS telefono, email, activo, notas, created_at, updated_at
@@ -396,19 +873,31 @@ def repo_update_by_id(
     if not fields:
         return False
 
-    fields.append("updated_at = ?")
-    params.append(datetime.now().isoformat(timespec="seconds"))
+    fields.append(f"updated_at = {_SQL_NOW}")
     params.append(cliente_id)
 
-    with get_conn() as con:
+    with get_conn() as con, writetxn(con):
         cur = con.execute(
             f"UPDATE clientes SET {', '.join(fields)} WHERE id = ?",
             params,
         )
+        if cur.rowcount and (nombre, apellido, telefono_e164, email_nuevo) != (None,) * 4:
+            # el SET ve los valores viejos: la clave se recalcula con la fila ya actualizada
+            con.execute(f"UPDATE clientes SET search_key = {_SQL_SEARCH_KEY} WHERE id = ?", (cliente_id,))
         return cur.rowcount > 0
 
+def repo_toggle_activo(cliente_id: int) -> Optional[bool]:
+    """ Invierte activo en un solo UPDATE; devuelve el estado nuevo o None si no existe. """
+    with get_conn() as con, writetxn(con):
+        row = con.execute(
+            f"UPDATE clientes SET activo = 1 - activo, updated_at = {_SQL_NOW}"
+            " WHERE id = ? RETURNING activo",
+            (cliente_id,),
+        ).fetchone()
+    return None if row is None else bool(row[0])
+
 def repo_delete_by_id(cliente_id: int) -> bool:
-    with get_conn() as con:
+    with get_conn() as con, writetxn(con):
         cur = con.execute("DELETE FROM clientes WHERE id = ?", (cliente_id,))
         return cur.rowcount > 0
 
@@ -447,49 +936,207 @@ def repo_update(
     if not fields:
         return False  # nada para actualizar
 
-    fields.append("updated_at = ?")
-    params.append(datetime.now().isoformat(timespec="seconds"))
+    fields.append(f"updated_at = {_SQL_NOW}")
     params.append(email_original)
 
-    with get_conn() as con:
+    with get_conn() as con, writetxn(con):
         cur = con.execute(
             f"UPDATE clientes SET {', '.join(fields)} WHERE email = ?",
             params,
         )
+        if cur.rowcount and (nombre, apellido, telefono_e164, email_nuevo) != (None,) * 4:
+            con.execute(
+                f"UPDATE clientes SET search_key = {_SQL_SEARCH_KEY} WHERE email = ?",
+                (email_nuevo if email_nuevo is not None else email_original,),
+            )
         return cur.rowcount > 0
 
 def repo_delete(email: str) -> bool:
-    with get_conn() as con:
+    with get_conn() as con, writetxn(con):
         cur = con.execute("DELETE FROM clientes WHERE email = ?", (email,))
         return cur.rowcount > 0
 
 # =========================
 # Ajustes (SMTP en SQLite)
 # =========================
+_smtp_cache: Optional[dict] = None  # lo arma get_smtp_config(); lo invalida cualquier escritura de ajustes
+
 def set_setting(key: str, value: str) -> None:
-    with get_conn() as con:
+    global _smtp_cache
+    with get_conn() as con, writetxn(con):
         con.execute(
             "INSERT INTO settings(key, value) VALUES(?, ?) "
             "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
             (key, value),
         )
+    _smtp_cache = None
+
+def set_settings(pairs: Dict[str, str]) -> None:
+    """Guarda varios ajustes en una sola transacción."""
+    global _smtp_cache
+    with get_conn() as con, writetxn(con):
+        con.executemany(
+            "INSERT INTO settings(key, value) VALUES(?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            list(pairs.items()),
+        )
+    _smtp_cache = None
 
 def get_settings() -> dict:
-    with get_conn() as con:
+    with get_conn(readonly=True) as con:
         cur = con.execute("SELECT key, value FROM settings")
         data = {row["key"]: row["value"] for row in cur.fetchall()}
     return data
 
 def get_smtp_config() -> dict:
     """Prioriza lo guardado en SQLite y cae a variables de entorno si falta algo."""
+    global _smtp_cache
+    if _smtp_cache is not None:
+        return dict(_smtp_cache)
     s = get_settings()
-    return {
+    _smtp_cache = {
         "host": s.get("SMTP_HOST") or os.getenv("SMTP_HOST", ""),
         "port": int(s.get("SMTP_PORT") or os.getenv("SMTP_PORT", "587")),
         "user": s.get("SMTP_USER") or os.getenv("SMTP_USER", ""),
         "password": s.get("SMTP_PASS") or os.getenv("SMTP_PASS", ""),
         "from": s.get("SMTP_FROM") or os.getenv("SMTP_FROM", os.getenv("SMTP_USER", "")) or "no-reply@example.com",
     }
+    return dict(_smtp_cache)
+
+def smtp_configurado() -> bool:
+    """True si hay host, usuario y contraseña (sale de la config memoizada)."""
+    cfg = get_smtp_config()
+    return bool(cfg["host"] and cfg["user"] and cfg["password"])
+
+# =========================
+# Exportación (XLSX)
+# =========================
+
+# (encabezado, expresión SQL) en el mismo orden que _SQL_LIST_SELECT
+_EXPORT_CLIENTES_COLS = [
+    ("id", "id"),
+    ("nombre", "nombre"),
+    ("apellido", "apellido"),
+    ("telefono", "telefono_e164"),
+    ("email", "email"),
+    ("activo", "activo"),
+    ("notas", "notas"),
+    ("created_at", "created_at"),
+    ("updated_at", "updated_at"),
+]
+_SQL_EXPORT_CLIENTES_WIDTHS = (
+    "SELECT " + ", ".join(f"MAX(LENGTH({expr}))" for _, expr in _EXPORT_CLIENTES_COLS) + " FROM clientes"
+)
+
+def repo_hay_clientes() -> bool:
+    with get_conn(readonly=True) as con:
+        return con.execute("SELECT EXISTS (SELECT 1 FROM clientes)").fetchone()[0] == 1
+
+def repo_clientes_etag() -> Optional[str]:
+    """
+    Huella de la tabla clientes para el ETag de la exportación (None si está vacía).
+    Combina el nonce de la base, el contador de revisiones (lo suben los triggers de
+    UPDATE/DELETE; así dos ediciones en el mismo segundo de updated_at no comparten ETag),
+    MAX(id) (cubre las altas) y COUNT(*) / MAX(updated_at).
+    """
+    with get_conn(readonly=True) as con:
+        total, max_id, max_upd, rev, base = con.execute(
+            "SELECT COUNT(*), MAX(id), MAX(updated_at),"
+            " (SELECT n FROM revisiones WHERE tabla = 'clientes'),"
+            " (SELECT n FROM revisiones WHERE tabla = '_base')"
+            " FROM clientes"
+        ).fetchone()
+    if not total:
+        return None
+    huella = f"clientes-{SCHEMA_VERSION}-{base}-{rev}-{total}-{max_id}-{max_upd}"
+    return hashlib.sha1(huella.encode()).hexdigest()
+
+def exportar_clientes_xlsx(destino) -> int:
+    """
+    Escribe los clientes a XLSX fila por fila desde el cursor de SQLite
+    (xlsxwriter en modo constant_memory), sin armar listas ni DataFrames.
+    `destino` puede ser una ruta o un archivo binario. Devuelve la cantidad de filas.
+    """
+    if xlsxwriter is None:
+        return _exportar_clientes_pandas(destino)
+
+    headers = [h for h, _ in _EXPORT_CLIENTES_COLS]
+    wb = xlsxwriter.Workbook(destino, {"constant_memory": True})
+    try:
+        ws = wb.add_worksheet("Clientes")
+        header_fmt = wb.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
+        text_fmt = wb.add_format({"num_format": "@"})
+        with get_conn_tuples() as con:
+            # anchos de columna: un solo agregado en SQLite en vez de recorrer las filas en Python
+            maximos = con.execute(_SQL_EXPORT_CLIENTES_WIDTHS).fetchone()
+            for col, (name, _expr) in enumerate(_EXPORT_CLIENTES_COLS):
+                col_len = maximos[col] or 0
+                fmt = text_fmt if name == "telefono" else None
+                ws.set_column(col, col, min(max(len(name), col_len) + 2, 50), fmt)
+
+            ws.write_row(0, 0, headers, header_fmt)
+            n = 0
+            for n, r in enumerate(con.execute(_SQL_LIST_ALL), start=1):
+                ws.write_row(n, 0, r)
+
+        ws.freeze_panes(1, 0)
+        ws.autofilter(0, 0, n, len(headers) - 1)
+    finally:
+        wb.close()
+    return n
+
+def _exportar_clientes_pandas(destino) -> int:
+    # respaldo si no está xlsxwriter (pandas + openpyxl)
+    import pandas as pd  # type: ignore
+
+    with get_conn(readonly=True) as con:
+        df = pd.read_sql_query(_SQL_LIST_ALL, con)
+    df.to_excel(destino, index=False, sheet_name="Clientes")
+    return len(df)
+
+_EXPORT_TURNOS_HEADERS = ["id", "inicio", "motivo", "cliente_id", "cliente_nombre", "cliente_email"]
+
+def repo_hay_turnos() -> bool:
+    with get_conn(readonly=True) as con:
+        return con.execute("SELECT EXISTS (SELECT 1 FROM turnos)").fetchone()[0] == 1
+
+def _iter_turnos_export() -> Iterator[list]:
+    with get_conn(readonly=True) as con:
+        for r in con.execute(_SQL_TURNOS_ALL):
+            cliente_nombre = ""
+            if r["apellido"] or r["nombre"]:
+                cliente_nombre = f"{r['apellido'] or ''}, {r['nombre'] or ''}".strip(", ").strip()
+            yield [r["id"], r["inicio"], r["motivo"], r["cliente_id"] or "", cliente_nombre, r["email"] or ""]
+
+def exportar_turnos_xlsx(destino) -> int:
+    """Igual que exportar_clientes_xlsx, para los turnos; el ancho de columna se mide en la misma pasada."""
+    if xlsxwriter is None:
+        import pandas as pd  # type: ignore  # respaldo (pandas + openpyxl)
+
+        df = pd.DataFrame(list(_iter_turnos_export()), columns=_EXPORT_TURNOS_HEADERS)
+        df.to_excel(destino, index=False, sheet_name="Turnos")
+        return len(df)
+
+    wb = xlsxwriter.Workbook(destino, {"constant_memory": True})
+    try:
+        ws = wb.add_worksheet("Turnos")
+        header_fmt = wb.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
+        ws.write_row(0, 0, _EXPORT_TURNOS_HEADERS, header_fmt)
+        widths = [len(h) for h in _EXPORT_TURNOS_HEADERS]
+        n = 0
+        for n, vals in enumerate(_iter_turnos_export(), start=1):
+            ws.write_row(n, 0, vals)
+            for j, v in enumerate(vals):
+                largo = len(str(v))
+                if largo > widths[j]:
+                    widths[j] = largo
+        for j, w in enumerate(widths):
+            ws.set_column(j, j, min(w + 2, 50))
+        ws.freeze_panes(1, 0)
+        ws.autofilter(0, 0, n, len(_EXPORT_TURNOS_HEADERS) - 1)
+    finally:
+        wb.close()
+    return n
 
 # =========================
 # Presentación (Rich)
@@ -576,6 +1223,65 @@ def cli_list(
     rows = repo_list(filtro)
     print_table(rows)
 
+@APP.command("import")
+def cli_import(
+    path: Path = typer.Argument(..., exists=True, dir_okay=False, help="CSV con columnas nombre, apellido, telefono, email (opcionales: activo, notas)"),
+    region: str = typer.Option(DEFAULT_REGION, help="Región para validar los teléfonos (US, AR, etc.)"),
+    lote: int = typer.Option(1000, min=1, help="Filas por transacción"),
+):
+    """Importa clientes desde un CSV, validando cada fila e insertando por lotes."""
+    init_db()
+    region = region.upper()
+    importados = 0
+    errores = 0
+    vistos: set = set()
+    pendientes: List[Tuple[int, Cliente]] = []  # (nro de fila, cliente)
+
+    def flush() -> None:
+        nonlocal importados, errores
+        if not pendientes:
+            return
+        try:
+            # chequeo e INSERT bajo el mismo lock de escritura: nadie mete el email en el medio
+            with get_conn() as con, writetxn(con):
+                existentes = repo_emails_existentes(c.email for _, c in pendientes)
+                for nro, c in pendientes:
+                    if c.email in existentes:
+                        errores += 1
+                        console.print(f"[bold red]Fila {nro}:[/bold red] el email {c.email} ya existe en la base.")
+                importados += len(repo_add_many(c for _, c in pendientes if c.email not in existentes))
+        except sqlite3.IntegrityError as e:
+            errores += len(pendientes)
+            console.print(f"[bold red]Lote descartado ({len(pendientes)} filas):[/bold red] {e}")
+        pendientes.clear()
+
+    with path.open(newline="", encoding="utf-8-sig") as f:
+        for nro, fila in enumerate(csv.DictReader(f), start=2):  # la fila 1 es el encabezado
+            try:
+                email_norm = validar_y_normalizar_email((fila.get("email") or "").strip())
+                if email_norm in vistos:
+                    raise ValueError(f"Email repetido en el archivo: {email_norm}")
+                tel_e164 = validar_y_normalizar_telefono((fila.get("telefono") or "").strip(), region=region)
+                activo = (fila.get("activo") or "1").strip().lower() not in {"0", "no", "false", "n"}
+                pendientes.append((nro, Cliente(
+                    nombre=(fila.get("nombre") or "").strip(),
+                    apellido=(fila.get("apellido") or "").strip(),
+                    telefono_e164=tel_e164,
+                    email=email_norm,
+                    activo=1 if activo else 0,
+                    notas=(fila.get("notas") or "").strip(),
+                )))
+                vistos.add(email_norm)
+            except ValueError as e:
+                errores += 1
+                console.print(f"[bold red]Fila {nro}:[/bold red] {e}")
+            if len(pendientes) >= lote:
+                flush()
+    flush()
+
+    console.print(f"[bold green]Importados:[/bold green] {importados}  [bold red]Con error:[/bold red] {errores}")
+    log(f"IMPORT {path.resolve()} ok={importados} error={errores}")
+
 @APP.command("update")
 def cli_update(
     email: str = typer.Option(..., prompt="Email (actual)"),
@@ -590,7 +1296,7 @@ def cli_update(
     """Modifica campos del cliente identificado por email actual."""
     init_db()
     try:
-        email_original = validar_y_normalizar_email(email)
+        email_original = validar_email_sintaxis(email)
         tel_e164 = None
         email_final = None
 
@@ -623,7 +1329,7 @@ def cli_delete(email: str = typer.Option(..., prompt=True), force: bool = typer.
     """Elimina un cliente por email."""
     init_db()
     try:
-        email_norm = validar_y_normalizar_email(email)
+        email_norm = validar_email_sintaxis(email)
     except ValueError as e:
         console.print(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
@@ -645,68 +1351,24 @@ def cli_delete(email: str = typer.Option(..., prompt=True), force: bool = typer.
 def cli_export(path: Path = typer.Option(Path("clientes.xlsx"), "--path", "-o", help="Ruta de salida XLSX")):
     """Exporta la lista de clientes a Excel."""
     init_db()
-    rows = repo_list(None)
-    if not rows:
+    if not repo_hay_clientes():
         console.print("[yellow]No hay clientes para exportar.[/yellow]")
         raise typer.Exit()
 
     try:
-        import pandas as pd  # type: ignore
-
-        data = [
-            {
-                "id": r["id"],
-                "nombre": r["nombre"],
-                "apellido": r["apellido"],
-                "telefono": r["telefono"],
-                "email": r["email"],
-                "activo": r["activo"],
-                "notas": r["notas"],
-                "created_at": r["created_at"],
-                "updated_at": r["updated_at"],
-            }
-            for r in rows
-        ]
-        df = pd.DataFrame(data)
-
-        try:
-            import xlsxwriter  # noqa: F401
-            engine = "xlsxwriter"
-        except Exception:
-            engine = None
-
-        if engine:
-            with pd.ExcelWriter(path, engine=engine) as writer:
-                df.to_excel(writer, sheet_name="Clientes", index=False, startrow=1, header=False)
-                wb = writer.book
-                ws = writer.sheets["Clientes"]
-
-                header_fmt = wb.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
-                for col, name in enumerate(df.columns):
-                    ws.write(0, col, name, header_fmt)
-                    col_len = max(len(str(name)), int(df[name].astype(str).map(len).max()))
-                    ws.set_column(col, col, min(col_len + 2, 50))
-
-                text_fmt = wb.add_format({"num_format": "@"})
-                tel_col = df.columns.get_loc("telefono")
-                ws.set_column(tel_col, tel_col, None, text_fmt)
-
-                ws.freeze_panes(1, 0)
-                ws.autofilter(0, 0, len(df), len(df.columns) - 1)
-        else:
-            df.to_excel(path, index=False, sheet_name="Clientes")
-
-        console.print(f"[bold green]Exportado:[/bold green] {path.resolve()}")
-        log(f"EXPORT {path.resolve()}")
+        exportar_clientes_xlsx(path)
     except ImportError:
-        console.print("[bold red]Necesitás instalar pandas para exportar: pip install pandas openpyxl xlsxwriter[/bold red]")
+        console.print("[bold red]Necesitás instalar xlsxwriter (o pandas + openpyxl) para exportar: pip install xlsxwriter[/bold red]")
+        return
+    console.print(f"[bold green]Exportado:[/bold green] {path.resolve()}")
+    log(f"EXPORT {path.resolve()}")
 
 @APP.command("get")
 def cli_get(email: str = typer.Option(..., prompt=True)):
     """Muestra un cliente por email."""
     init_db()
     try:
-        email_norm = validar_y_normalizar_email(email)
+        email_norm = validar_email_sintaxis(email)
     except ValueError as e:
         console.print(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
@@ -730,33 +1392,35 @@ def cli_shell():
     """
     init_db()
     console.print("[bold]Modo interactivo.[/bold] Escribí [green]help[/green] para ayuda, [red]exit[/red] para salir.")
-    while True:
-        try:
-            raw = input("gestor> ").strip()
-        except (EOFError, KeyboardInterrupt):
-            console.print()
-            break
-
-        if not raw:
-            continue
-
-        cmd = raw.lower()
-        if cmd in {"exit", "quit", "salir"}:
-            break
-        if cmd in {"help", "ayuda", "?"}:
+    # una sola conexión para toda la sesión: cada comando la reutiliza vía get_conn()
+    with _sesion_conn():
+        while True:
+            try:
+                raw = input("gestor> ").strip()
+            except (EOFError, KeyboardInterrupt):
+                console.print()
+                break
+
+            if not raw:
+                continue
+
+            cmd = raw.lower()
+            if cmd in {"exit", "quit", "salir"}:
+                break
+            if cmd in {"help", "ayuda", "?"}:
+                try:
+                    APP(standalone_mode=False, args=["--help"])
+                except SystemExit:
+                    pass
+                continue
+
             try:
-                APP(standalone_mode=False, args=["--help"])
+                args = shlex.split(raw)
+                APP(standalone_mode=False, args=args)
             except SystemExit:
                 pass
-            continue
-
-        try:
-            args = shlex.split(raw)
-            APP(standalone_mode=False, args=args)
-        except SystemExit:
-            pass
-        except Exception as e:
-            console.print(f"[red]Error:[/red] {e}")
+            except Exception as e:
+                console.print(f"[red]Error:[/red] {e}")
 
 # =========================
 # Web (Flask + Tailwind)
@@ -765,12 +1429,94 @@ def cli_shell():
 app = Flask(__name__)
 app.secret_key = "change-me"  # para flash messages
 
+# Son pocos templates y fijos: cache sin límite y sin re-chequear archivos (cli_web lo reactiva con --debug)
+app.config["TEMPLATES_AUTO_RELOAD"] = False
+app.jinja_env.auto_reload = False
+app.jinja_env.cache = {}
+
+# Páginas GET que el navegador puede reusar unos segundos (listados y pantallas de detalle)
+_CACHEABLE_ENDPOINTS = {
+    "landing", "clientes", "notas", "turnos", "exportar_menu", "edit_cliente", "turnos_editar",
+}
+
+# URLs del menú de base.html: no dependen del request salvo por el prefijo de montaje
+# (SCRIPT_NAME), así que se resuelven una vez por prefijo y no en cada render
+_NAV_ENDPOINTS = ("landing", "clientes", "turnos", "notas", "correo", "new_cliente", "exportar_menu")
+_nav_cache: Dict[str, Dict[str, str]] = {}
+
+def _static_version() -> str:
+    # mtime del CSS: fuera de debug se lee una vez por proceso (queda en _nav_cache), así que
+    # una edición recién se ve al reiniciar; con --debug se lee en cada render
+    try:
+        return str(int((STATIC_DIR / "app.css").stat().st_mtime))
+    except OSError:
+        return "0"
+
+@app.context_processor
+def _nav_urls() -> dict:
+    nav = _nav_cache.get(request.script_root)
+    if nav is None:
+        nav = {e: url_for(e) for e in _NAV_ENDPOINTS}
+        nav["css"] = url_for("static", filename="app.css", v=_static_version())
+        _nav_cache[request.script_root] = nav
+    if app.debug:
+        # el reloader solo reinicia por cambios en .py: el ?v= tiene que seguir al app.css editado
+        nav = {**nav, "css": url_for("static", filename="app.css", v=_static_version())}
+    return {"_nav": nav}
+
+@app.before_request
+def _init_db_once() -> None:
+    init_db()  # memoizado: después del primer request es solo un chequeo de flag
+
+@app.after_request
+def _cache_headers(resp):
+    if request.method != "GET":
+        # cada escritura cambia la cookie de sesión -> con "Vary: Cookie" el navegador
+        # no vuelve a mostrar un listado cacheado de antes del cambio
+        session["rev"] = session.get("rev", 0) + 1
+    elif request.endpoint == "static" and not app.debug:
+        # el link al CSS lleva ?v=<mtime>: cada versión es una URL distinta y se puede cachear para siempre
+        # (en debug queda el default de Flask, que revalida)
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    elif resp.status_code == 200 and request.endpoint in _CACHEABLE_ENDPOINTS:
+        resp.headers.setdefault("Cache-Control", "private, max-age=30")
+        resp.vary.add("Cookie")
+    return resp
+
+_TEMPLATES_READY = False  # una sola vez por proceso
+
 def ensure_templates() -> None:
     """
     Crea los templates por primera vez únicamente si no existen.
     NO sobrescribe archivos ya presentes (para no pisar cambios).
+    Deja un centinela (templates/.ready): los arranques siguientes no revisan archivo por archivo.
+    Si borrás un template y querés que se regenere, borrá también el .ready.
     """
+    global _TEMPLATES_READY
+    if _TEMPLATES_READY:
+        return
+    # Bytecode de los templates en disco: se compilan una vez y los próximos arranques lo reutilizan.
+    # Se arma acá y no al importar, así los comandos de la CLI no crean .jinja_cache/
+    try:
+        JINJA_CACHE_DIR.mkdir(exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(JINJA_CACHE_DIR))
+    except OSError:
+        pass  # sin permiso de escritura: Jinja compila en memoria como siempre
     tdir = TEMPLATES_DIR
+    sentinel = tdir / ".ready"
+    if not sentinel.exists():
+        _escribir_templates(tdir)
+        try:
+            sentinel.touch()
+        except OSError:
+            pass  # templates/ de solo lectura: sin centinela, el próximo arranque vuelve a revisar
+
+    # Compilar todo ahora para que el primer request no pague el parseo de Jinja
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(name)
+    _TEMPLATES_READY = True
+
+def _escribir_templates(tdir: Path) -> None:
     tdir.mkdir(exist_ok=True)
 
     def write_if_missing(path: Path, content: str) -> None:
@@ -816,14 +1562,14 @@ def ensure_templates() -> None:
   <body>
     <nav class="nav">
       <div class="container flex items-center justify-between" style="padding:.75rem 1rem">
-        <a href="{{ url_for('landing') }}" style="font-weight:600;color:#0f172a;text-decoration:none">Gestor</a>
+        <a href="{{ _nav.landing }}" style="font-weight:600;color:#0f172a;text-decoration:none">Gestor</a>
         <div class="space-x-2">
-          <a href="{{ url_for('landing') }}" class="btn btn-ghost">Inicio</a>
-          <a href="{{ url_for('clientes') }}" class="btn btn-ghost">Clientes</a>
-          <a href="{{ url_for('notas') }}" class="btn btn-ghost">Notas</a>
-          <a href="{{ url_for('correo') }}" class="btn btn-ghost">Correo</a>
-          <a href="{{ url_for('new_cliente') }}" class="btn btn-indigo">Nuevo</a>
-          <a href="{{ url_for('exportar_menu') }}" class="btn btn-emerald">Exportar</a>
+          <a href="{{ _nav.landing }}" class="btn btn-ghost">Inicio</a>
+          <a href="{{ _nav.clientes }}" class="btn btn-ghost">Clientes</a>
+          <a href="{{ _nav.notas }}" class="btn btn-ghost">Notas</a>
+          <a href="{{ _nav.correo }}" class="btn btn-ghost">Correo</a>
+          <a href="{{ _nav.new_cliente }}" class="btn btn-indigo">Nuevo</a>
+          <a href="{{ _nav.exportar_menu }}" class="btn btn-emerald">Exportar</a>
         </div>
       </div>
     </nav>
@@ -860,9 +1606,9 @@ def ensure_templates() -> None:
     <h1 style="margin:0 0 .5rem 0">Bienvenido 👋</h1>
     <p class="muted">Elegí una opción:</p>
     <div class="mt-4">
-      <a class="btn btn-dark" href="{{ url_for('clientes') }}">Ir a Clientes</a>
-      <a class="btn" href="{{ url_for('notas') }}">Ver Notas</a>
-      <a class="btn" href="{{ url_for('correo') }}">Enviar Correo</a>
+      <a class="btn btn-dark" href="{{ _nav.clientes }}">Ir a Clientes</a>
+      <a class="btn" href="{{ _nav.notas }}">Ver Notas</a>
+      <a class="btn" href="{{ _nav.correo }}">Enviar Correo</a>
     </div>
   </div>
 {% endblock %}
@@ -903,74 +1649,40 @@ def ensure_templates() -> None:
 # Lista de clientes -> ahora en /clientes
 @app.route("/clientes")
 def clientes():
-    init_db()
-    q = (request.args.get("q") or "").strip().lower()
+    q = request.args.get("q") or ""
     solo_activos = bool(request.args.get("solo_activos"))
 
-    rows = repo_list(True if solo_activos else None)
-
-    if q:
-        def matches(r: sqlite3.Row) -> bool:
-            return (
-                q in (r["nombre"] or "").lower()
-                or q in (r["apellido"] or "").lower()
-                or q in (r["email"] or "").lower()
-                or q in (r["telefono"] or "").lower()
-            )
-        rows = [r for r in rows if matches(r)]
-
-    # convertir a objetos simples para Jinja
-    class RowObj:
-        def __init__(self, r: sqlite3.Row):
-            self.id = r["id"]
-            self.nombre = r["nombre"]
-            self.apellido = r["apellido"]
-            self.telefono = r["telefono"]
-            self.email = r["email"]
-            self.activo = bool(r["activo"])
-            self.notas = r["notas"]
-    clientes = [RowObj(r) for r in rows]
-
-    return render_template("index.html", clientes=clientes)
+    # sqlite3.Row va directo a Jinja: {{ c.nombre }} cae en r["nombre"] y activo (0/1) se evalúa como bool
+    rows = repo_search(q, solo_activos)
+    return render_template("index.html", clientes=rows)
 
 # Landing / portada en "/"
 @app.route("/")
 def landing():
-    init_db()
-    # KPIs
-    total = len(repo_list(None))
-    activos = len(repo_list(True))
-    inactivos = len(repo_list(False))
-    notas_total = len(repo_notas_list(None))
+    # KPIs (agregados en SQLite, sin traer filas)
+    counts = repo_counts()
+    notas_total = repo_notas_count()
 
     # últimas 5 notas
-    recientes = repo_notas_list(None)[:5]
-
-    # estado de SMTP
-    try:
-        cfg = get_smtp_config()  # si no lo tenés, ya te lo pasé antes
-        smtp_ok = bool(cfg["host"] and cfg["user"] and cfg["password"])
-    except NameError:
-        smtp_ok = False
+    recientes = repo_notas_recent(5)
 
     stats = {
-        "total": total,
-        "activos": activos,
-        "inactivos": inactivos,
+        **counts,
         "notas": notas_total,
-        "smtp_ok": smtp_ok,
+        "smtp_ok": smtp_configurado(),
     }
     return render_template("landing.html", stats=stats, recientes=recientes)
 
 @app.route("/ajustes", methods=["GET", "POST"])
 def ajustes():
-    init_db()
     if request.method == "POST":
-        set_setting("SMTP_HOST", (request.form.get("SMTP_HOST") or "").strip())
-        set_setting("SMTP_PORT", (request.form.get("SMTP_PORT") or "587").strip())
-        set_setting("SMTP_USER", (request.form.get("SMTP_USER") or "").strip())
-        set_setting("SMTP_PASS", (request.form.get("SMTP_PASS") or "").strip())
-        set_setting("SMTP_FROM", (request.form.get("SMTP_FROM") or "").strip())
+        set_settings({
+            "SMTP_HOST": (request.form.get("SMTP_HOST") or "").strip(),
+            "SMTP_PORT": (request.form.get("SMTP_PORT") or "587").strip(),
+            "SMTP_USER": (request.form.get("SMTP_USER") or "").strip(),
+            "SMTP_PASS": (request.form.get("SMTP_PASS") or "").strip(),
+            "SMTP_FROM": (request.form.get("SMTP_FROM") or "").strip(),
+        })
         flash("Ajustes guardados.", "success")
         return redirect(url_for("ajustes"))
 
@@ -979,20 +1691,19 @@ def ajustes():
 
 @app.route("/clientes/nuevo", methods=["GET", "POST"])
 def new_cliente():
-    init_db()
     form = {
         "nombre": request.form.get("nombre", ""),
         "apellido": request.form.get("apellido", ""),
         "telefono": request.form.get("telefono", ""),
         "email": request.form.get("email", ""),
-        "region": request.form.get("region", DEFAULT_REGION),
+        "region": (request.form.get("region") or DEFAULT_REGION).strip().upper(),
         "activo": bool(request.form.get("activo")),
         "notas": request.form.get("notas", ""),
     }
     if request.method == "POST":
         try:
             email_norm = validar_y_normalizar_email(form["email"])  # normaliza
-            tel_e164 = validar_y_normalizar_telefono(form["telefono"], region=form["region"].upper())
+            tel_e164 = validar_y_normalizar_telefono(form["telefono"], region=form["region"])
             cliente = Cliente(
                 nombre=form["nombre"].strip(),
                 apellido=form["apellido"].strip(),
@@ -1013,7 +1724,6 @@ def new_cliente():
 
 @app.route("/clientes/<int:cliente_id>/editar", methods=["GET", "POST"])
 def edit_cliente(cliente_id: int):
-    init_db()
     row = repo_get_by_id(cliente_id)
     if not row:
         flash("Cliente no encontrado.", "error")
@@ -1025,13 +1735,20 @@ def edit_cliente(cliente_id: int):
             "apellido": request.form.get("apellido", row["apellido"]).strip(),
             "telefono": request.form.get("telefono", row["telefono"]),
             "email": request.form.get("email", row["email"]).strip(),
-            "region": request.form.get("region", DEFAULT_REGION),
+            "region": (request.form.get("region") or DEFAULT_REGION).strip().upper(),
             "activo": bool(request.form.get("activo")),
             "notas": request.form.get("notas", row["notas"] or ""),
         }
         try:
-            email_norm = validar_y_normalizar_email(form["email"]) if form["email"] else row["email"]
-            tel_e164 = validar_y_normalizar_telefono(form["telefono"], region=form["region"].upper()) if form["telefono"] else row["telefono"]
+            # sin cambios (o vacío) -> se queda lo guardado, ya normalizado: ni DNS ni phonenumbers
+            if form["email"] in ("", row["email"]):
+                email_norm = row["email"]
+            else:
+                email_norm = validar_y_normalizar_email(form["email"])
+            if form["telefono"].strip() in ("", row["telefono"]):
+                tel_e164 = row["telefono"]
+            else:
+                tel_e164 = validar_y_normalizar_telefono(form["telefono"], region=form["region"])
             ok = repo_update_by_id(
                 cliente_id,
                 nombre=form["nombre"],
@@ -1065,7 +1782,6 @@ def edit_cliente(cliente_id: int):
 
 @app.route("/clientes/<int:cliente_id>/eliminar", methods=["POST"])
 def delete_cliente(cliente_id: int):
-    init_db()
     if repo_delete_by_id(cliente_id):
         flash("Cliente eliminado.", "success")
     else:
@@ -1074,19 +1790,44 @@ def delete_cliente(cliente_id: int):
 
 @app.route("/clientes/<int:cliente_id>/toggle", methods=["POST"])
 def toggle_cliente(cliente_id: int):
-    init_db()
-    row = repo_get_by_id(cliente_id)
-    if not row:
+    if repo_toggle_activo(cliente_id) is None:
         flash("Cliente no encontrado.", "error")
         return redirect(url_for("clientes"))
-    nuevo = 0 if row["activo"] else 1
-    repo_update_by_id(cliente_id, activo=bool(nuevo))
     flash("Estado actualizado.", "success")
     return redirect(url_for("clientes"))
 
+# ----------- API (fetch desde los listados) -----------
+# Mismas acciones que los forms de arriba, pero responden JSON: la página actualiza
+# solo la fila en vez de redirigir y re-renderizar el listado completo.
+# Los forms siguen funcionando igual si no hay JavaScript.
+
+@app.route("/api/clientes/<int:cliente_id>/toggle", methods=["POST"])
+def api_toggle_cliente(cliente_id: int):
+    nuevo = repo_toggle_activo(cliente_id)
+    if nuevo is None:
+        return jsonify(ok=False, error="Cliente no encontrado."), 404
+    return jsonify(ok=True, activo=nuevo)
+
+@app.route("/api/clientes/<int:cliente_id>/eliminar", methods=["POST"])
+def api_delete_cliente(cliente_id: int):
+    if repo_delete_by_id(cliente_id):
+        return jsonify(ok=True)
+    return jsonify(ok=False, error="No se encontró el cliente."), 404
+
+@app.route("/api/notas/<int:nota_id>/eliminar", methods=["POST"])
+def api_notas_eliminar(nota_id: int):
+    if repo_notas_delete(nota_id):
+        return jsonify(ok=True)
+    return jsonify(ok=False, error="No se encontró la nota."), 404
+
+@app.route("/api/turnos/<int:turno_id>/eliminar", methods=["POST"])
+def api_turnos_eliminar(turno_id: int):
+    if repo_turnos_delete(turno_id):
+        return jsonify(ok=True)
+    return jsonify(ok=False, error="No se encontró el turno."), 404
+
 @app.route("/notas", methods=["GET", "POST"])
 def notas():
-    init_db()
     # Para crear nota rápida desde esta página
     if request.method == "POST":
         cliente_id = int(request.form.get("cliente_id", "0") or "0")
@@ -1094,18 +1835,21 @@ def notas():
         if not cliente_id or not contenido:
             flash("Completá cliente y contenido.", "error")
         else:
-            repo_notas_add(cliente_id, contenido)
-            flash("Nota creada.", "success")
+            try:
+                repo_notas_add(cliente_id, contenido)
+                flash("Nota creada.", "success")
+            except sqlite3.IntegrityError:
+                # foreign_keys está activo: el cliente del selector pudo haberse borrado
+                flash("El cliente seleccionado ya no existe.", "error")
         return redirect(url_for("notas"))
 
     # Listado y selector
-    rows_clientes = repo_list(None)
+    rows_clientes = repo_list_for_select()
     notas_rows = repo_notas_list(None)
     return render_template("notas.html", clientes=rows_clientes, notas=notas_rows)
 
 @app.route("/notas/<int:nota_id>/eliminar", methods=["POST"])
 def notas_eliminar(nota_id: int):
-    init_db()
     if repo_notas_delete(nota_id):
         flash("Nota eliminada.", "success")
     else:
@@ -1114,7 +1858,6 @@ def notas_eliminar(nota_id: int):
 
 @app.route("/correo", methods=["GET", "POST"])
 def correo():
-    init_db()
     # Para prefijar email al entrar con ?cliente_id=...
     pref_cliente_id = request.args.get("cliente_id")
     pref_email = ""
@@ -1131,17 +1874,15 @@ def correo():
             destino = validar_y_normalizar_email(email)
             if not asunto or not cuerpo:
                 raise ValueError("Asunto y cuerpo son obligatorios.")
-            enviar_email(destino, asunto, cuerpo)
-            flash("Correo enviado.", "success")
+            encolar_email(destino, asunto, cuerpo)
+            flash("Correo en cola de envío.", "success")
             return redirect(url_for("correo"))
         except Exception as e:
             flash(f"Error al enviar: {e}", "error")
 
    # siempre pasar lista de clientes para elegir rápido
-    rows_clientes = repo_list(None)
-    cfg = get_smtp_config()
-    smtp_ok = bool(cfg["host"] and cfg["user"] and cfg["password"])
-    return render_template("correo.html", clientes=rows_clientes, pref_email=pref_email, smtp_ok=smtp_ok)
+    rows_clientes = repo_list_for_select()
+    return render_template("correo.html", clientes=rows_clientes, pref_email=pref_email, smtp_ok=smtp_configurado())
 
 # ----------- EXPORTACIÓN (WEB) -----------
 
@@ -1149,7 +1890,6 @@ def correo():
 @app.route("/exportar/opciones")
 @app.route("/export")
 def exportar_menu():
-    init_db()
     return render_template("exportar.html")
 
 # Exportar CLIENTES (alias del endpoint antiguo /exportar)
@@ -1160,130 +1900,63 @@ def exportar_clientes():
 # Exportar TURNOS
 @app.route("/exportar/turnos")
 def exportar_turnos():
-    init_db()
-    rows = repo_turnos_list(None)
-    if not rows:
+    if not repo_hay_turnos():
         flash("No hay turnos para exportar.", "error")
         return redirect(url_for("turnos"))
 
+    buffer = io.BytesIO()
     try:
-        import pandas as pd  # type: ignore
-
-        data = []
-        for r in rows:
-            cliente_nombre = ""
-            if r["apellido"] or r["nombre"]:
-                cliente_nombre = f"{r['apellido'] or ''}, {r['nombre'] or ''}".strip(", ").strip()
-            data.append({
-                "id": r["id"],
-                "inicio": r["inicio"],
-                "motivo": r["motivo"],
-                "cliente_id": r["cliente_id"] or "",
-                "cliente_nombre": cliente_nombre,
-                "cliente_email": r["email"] or "",
-            })
-
-        df = pd.DataFrame(data)
-        buffer = io.BytesIO()
-
-        try:
-            import xlsxwriter  # noqa: F401
-            engine = "xlsxwriter"
-        except Exception:
-            engine = None
-
-        if engine:
-            with pd.ExcelWriter(buffer, engine=engine) as writer:
-                df.to_excel(writer, sheet_name="Turnos", index=False, startrow=1, header=False)
-                wb = writer.book
-                ws = writer.sheets["Turnos"]
-                header_fmt = wb.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
-                for col, name in enumerate(df.columns):
-                    ws.write(0, col, name, header_fmt)
-                    col_len = max(len(str(name)), int(df[name].astype(str).map(len).max()))
-                    ws.set_column(col, col, min(col_len + 2, 50))
-                ws.freeze_panes(1, 0)
-                ws.autofilter(0, 0, len(df), len(df.columns) - 1)
-        else:
-            df.to_excel(buffer, index=False, sheet_name="Turnos")
-
-        buffer.seek(0)
-        fname = f"turnos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name=fname,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+        exportar_turnos_xlsx(buffer)
     except ImportError:
-        flash("Necesitás instalar pandas para exportar.", "error")
+        flash("Necesitás instalar xlsxwriter para exportar.", "error")
         return redirect(url_for("turnos"))
 
+    buffer.seek(0)
+    fname = f"turnos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return send_file(
+        buffer,
+        as_attachment=True,
+        download_name=fname,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
 # Exportar CLIENTES (endpoint legado /exportar)
 @app.route("/exportar")
 def exportar():
-    init_db()
-    rows = repo_list(None)
-    if not rows:
+    etag = repo_clientes_etag()
+    if etag is None:
         flash("No hay clientes para exportar.", "error")
         return redirect(url_for("clientes"))
-
+    if request.if_none_match.contains(etag):
+        # el navegador ya tiene este mismo XLSX: no se vuelve a generar
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+
+    buffer = io.BytesIO()
     try:
-        import pandas as pd  # type: ignore
-
-        data = [
-            {
-                "id": r["id"],
-                "nombre": r["nombre"],
-                "apellido": r["apellido"],
-                "telefono": r["telefono"],
-                "email": r["email"],
-                "activo": r["activo"],
-                "notas": r["notas"],
-                "created_at": r["created_at"],
-                "updated_at": r["updated_at"],
-            }
-            for r in rows
-        ]
-        df = pd.DataFrame(data)
-        buffer = io.BytesIO()
-
-        try:
-            import xlsxwriter  # noqa: F401
-            engine = "xlsxwriter"
-        except Exception:
-            engine = None
-
-        if engine:
-            with pd.ExcelWriter(buffer, engine=engine) as writer:
-                df.to_excel(writer, sheet_name="Clientes", index=False, startrow=1, header=False)
-                wb = writer.book
-                ws = writer.sheets["Clientes"]
-                header_fmt = wb.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
-                for col, name in enumerate(df.columns):
-                    ws.write(0, col, name, header_fmt)
-                    col_len = max(len(str(name)), int(df[name].astype(str).map(len).max()))
-                    ws.set_column(col, col, min(col_len + 2, 50))
-                text_fmt = wb.add_format({"num_format": "@"})
-                tel_col = df.columns.get_loc("telefono")
-                ws.set_column(tel_col, tel_col, None, text_fmt)
-                ws.freeze_panes(1, 0)
-                ws.autofilter(0, 0, len(df), len(df.columns) - 1)
-        else:
-            # fallback simple
-            df.to_excel(buffer, index=False, sheet_name="Clientes")
-        buffer.seek(0)
-        fname = f"clientes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        return send_file(buffer, as_attachment=True, download_name=fname, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        exportar_clientes_xlsx(buffer)
     except ImportError:
-        flash("Necesitás instalar pandas para exportar.", "error")
+        flash("Necesitás instalar xlsxwriter para exportar.", "error")
         return redirect(url_for("clientes"))
 
+    buffer.seek(0)
+    fname = f"clientes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    resp = send_file(
+        buffer,
+        as_attachment=True,
+        download_name=fname,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        etag=etag,
+    )
+    resp.headers["Cache-Control"] = "private, no-cache"  # guardarlo, pero revalidar siempre con el ETag
+    return resp
+
 # ----------- TURNOS (pantalla) -----------
 
 @app.route("/turnos", methods=["GET", "POST"])
 def turnos():
-    init_db()
     if request.method == "POST":
         # Alta de turno
         raw_cliente = (request.form.get("cliente_id") or "").strip()
@@ -1298,18 +1971,19 @@ def turnos():
             repo_turnos_add(cliente_id, fecha, hora, motivo)
             flash("Turno creado.", "success")
             return redirect(url_for("turnos"))
+        except sqlite3.IntegrityError:
+            flash("El cliente seleccionado ya no existe.", "error")
         except ValueError as e:
             flash(str(e), "error")
 
     # Listados
-    clientes = repo_list(None)
-    proximos = repo_turnos_list(True)
-    pasados  = repo_turnos_list(False)[:20]  # últimos 20
+    clientes = repo_list_for_select()
+    proximos = repo_turnos_upcoming()
+    pasados  = repo_turnos_recent_past(20)  # últimos 20
     return render_template("turnos.html", clientes=clientes, proximos=proximos, pasados=pasados)
 
 @app.route("/turnos/<int:turno_id>/eliminar", methods=["POST"])
 def turnos_eliminar(turno_id: int):
-    init_db()
     if repo_turnos_delete(turno_id):
         flash("Turno eliminado.", "success")
     else:
@@ -1318,7 +1992,6 @@ def turnos_eliminar(turno_id: int):
 
 @app.route("/turnos/<int:turno_id>/editar", methods=["GET", "POST"])
 def turnos_editar(turno_id: int):
-    init_db()
     row = repo_turnos_get(turno_id)
     if not row:
         flash("Turno no encontrado.", "error")
@@ -1336,6 +2009,8 @@ def turnos_editar(turno_id: int):
             else:
                 flash("Sin cambios.", "error")
             return redirect(url_for("turnos"))
+        except sqlite3.IntegrityError:
+            flash("El cliente seleccionado ya no existe.", "error")
         except ValueError as e:
             flash(str(e), "error")
 
@@ -1343,12 +2018,11 @@ def turnos_editar(turno_id: int):
     # row["inicio"] = "YYYY-MM-DD HH:MM"
     fecha_pref = row["inicio"][:10]
     hora_pref  = row["inicio"][11:16]
-    clientes = repo_list(None)
+    clientes = repo_list_for_select()
+    # pantalla propia: solo el formulario, sin volver a cargar los listados de turnos
     return render_template(
-        "turnos.html",
+        "turnos_edit.html",
         clientes=clientes,
-        proximos=repo_turnos_list(True),
-        pasados=repo_turnos_list(False)[:20],
         edit_row=row,
         fecha_pref=fecha_pref,
         hora_pref=hora_pref,
@@ -1362,6 +2036,8 @@ def cli_web(
 ):
     init_db()
     ensure_templates()  # ahora NO sobrescribe, solo crea si faltan
+    app.config["TEMPLATES_AUTO_RELOAD"] = debug
+    app.jinja_env.auto_reload = debug  # fuera de debug no se re-chequean los templates en cada render
     from pathlib import Path
     tpl = (Path(app.root_path) / (app.template_folder or "templates")).resolve()
     console.print(f"[bold green]Servidor web en[/bold green] http://{host}:{port}")